@@ -0,0 +1,72 @@
+import os
+import json
+from datetime import datetime
+
+from canvas_file_scraper.util import dump_json_atomic
+
+
+JOURNAL_NAME = ".failures.json"
+
+
+class FailureJournal:
+    """Failed items from previous runs, keyed by kind, id and target path.
+
+    The journal is rewritten atomically on every change so that a killed
+    run never loses the failures recorded before it died.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.recorded = set()
+        self._records = {}
+        if os.path.isfile(path):
+            with open(path, "r") as f:
+                self._records = json.load(f)
+
+    def __len__(self):
+        return len(self._records)
+
+    def records(self):
+        return list(self._records.values())
+
+    @staticmethod
+    def key(kind, id, path):
+        return f"{kind}|{id}|{path}"
+
+    def record(
+            self, kind, id=None, url=None, path=None, error=None,
+            course_id=None, data=None):
+        key = self.key(kind, id, path)
+        previous = self._records.get(key, {})
+        if isinstance(error, Exception):
+            error = f"{type(error).__name__}: {error}"
+        self._records[key] = {
+            "key": key,
+            "kind": kind,
+            "id": id,
+            "url": url,
+            "path": path,
+            "course_id": course_id,
+            "data": data or {},
+            "error": error,
+            "attempts": previous.get("attempts", 0) + 1,
+            "last_attempt": datetime.now().isoformat(timespec="seconds"),
+        }
+        self.recorded.add(key)
+        self._save()
+        return key
+
+    def failures(self, course_id, new_only=False):
+        """Count outstanding failures for a course, or only this run's."""
+        keys = self.recorded if new_only else self._records
+        return sum(
+            1 for k in keys
+            if k in self._records
+            and self._records[k]["course_id"] == course_id)
+
+    def resolve(self, key):
+        if self._records.pop(key, None) is not None:
+            self._save()
+
+    def _save(self):
+        dump_json_atomic(self._records, self.path)
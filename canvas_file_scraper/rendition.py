@@ -0,0 +1,102 @@
+# Keeps a plain --video run from pulling full HD lecture recordings
+DEFAULT_PREFERRED_HEIGHT = 720
+
+
+def _int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class Rendition:
+    """Common view over Canvas media sources and Kaltura flavor assets.
+
+    Both report bitrate in kbps and size in KB.
+    """
+
+    def __init__(self, source):
+        self.source = source
+        self.height = _int(source.get("height"))
+        self.bitrate = _int(source.get("bitrate"))
+        size = _int(source.get("size"))
+        self.size = size * 1024 if size is not None else None
+        self.container = (
+            source.get("fileExt")
+            or (source.get("content_type") or "").rpartition("/")[2]
+            or None)
+        # Kaltura marks the uploaded source file, which is usually far
+        # bigger than any of its transcodes
+        self.is_original = (
+            str(source.get("isOriginal", "")).lower() in ("1", "true")
+            or source.get("flavorParamsId") == 0)
+
+    def __str__(self):
+        height = f"{self.height}p" if self.height else "unknown resolution"
+        size = (
+            f"~{self.size / 1024 ** 2:.1f} MB" if self.size is not None
+            else "unknown size")
+        return f"{height} {self.container or 'unknown'} ({size})"
+
+
+class RenditionPolicy:
+    def __init__(
+            self, max_height=None, max_bitrate=None, max_size=None,
+            container="mp4", original=False,
+            preferred_height=DEFAULT_PREFERRED_HEIGHT):
+        self.max_height = max_height
+        # A soft limit, only used when no hard one was given
+        self.preferred_height = None if max_height else preferred_height
+        self.max_bitrate = max_bitrate
+        self.max_size = max_size
+        self.container = container
+        self.original = original
+
+    def select(self, sources):
+        """Pick the best rendition that fits the limits.
+
+        Renditions in the preferred container win, then the highest
+        resolution and bitrate. Returns None if nothing fits, the limits
+        are never exceeded. The preferred height is only a default, if
+        nothing is that small the smallest rendition is used instead.
+        """
+        fitting = [
+            r for r in (Rendition(s) for s in sources) if self.fits(r)]
+        if not fitting:
+            return None
+        if self.preferred_height:
+            preferred = [
+                r for r in fitting
+                if not self._exceeds(r.height, self.preferred_height)]
+            if not preferred:
+                return min(
+                    fitting, key=lambda r: (r.height or 0, r.size or 0))
+            fitting = preferred
+        return max(fitting, key=self._preference_key)
+
+    def select_flavor(self, flavor_assets):
+        # Only flavors that finished converting (status 2) can be played
+        return self.select(
+            f for f in flavor_assets if f.get("status", 2) == 2)
+
+    def fits(self, rendition):
+        if rendition.is_original and not self.original:
+            return False
+        return not (
+            self._exceeds(rendition.height, self.max_height)
+            or self._exceeds(rendition.bitrate, self.max_bitrate)
+            or self._exceeds(rendition.size, self.max_size))
+
+    def is_progressive(self, rendition):
+        return bool(self.container) and rendition.container == self.container
+
+    @staticmethod
+    def _exceeds(value, limit):
+        return limit is not None and value is not None and value > limit
+
+    def _preference_key(self, rendition):
+        return (
+            self.is_progressive(rendition),
+            rendition.height or 0,
+            rendition.bitrate or 0,
+            rendition.size or 0)
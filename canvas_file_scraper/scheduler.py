@@ -0,0 +1,119 @@
+import re
+import time
+from collections import OrderedDict, deque
+
+
+# Documents first, bulky media last
+DEFAULT_PRIORITY = ["file", "attachment", "link", "media", "video"]
+
+# Kinds big enough that they are held back until every course is walked
+BULK_KINDS = ("media", "video")
+
+_SIZE_UNITS = {"": 1, "K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}
+
+
+def parse_priority(value):
+    """Parse a comma separated list of download kinds."""
+    kinds = value.split(",")
+    unknown = [k for k in kinds if k not in DEFAULT_PRIORITY]
+    if unknown:
+        raise ValueError(f"Unknown download kinds {', '.join(unknown)}")
+    return kinds
+
+
+def parse_size(value):
+    """Parse a byte count like '500K', '2M' or '1.5G' into an int."""
+    match = re.fullmatch(r"\s*(\d+(?:\.\d+)?)\s*([KMG]?)i?B?\s*", value, re.I)
+    if not match:
+        raise ValueError(f"Invalid size '{value}'")
+    number, unit = match.groups()
+    return int(float(number) * _SIZE_UNITS[unit.upper()])
+
+
+class TokenBucket:
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+
+    def consume(self, n):
+        now = time.monotonic()
+        self._tokens = min(
+            self.capacity, self._tokens + (now - self._last) * self.rate)
+        self._last = now
+        self._tokens -= n
+        if self._tokens < 0:
+            # Sleep off the debt, it is refilled on the next call
+            time.sleep(-self._tokens / self.rate)
+
+
+class Download:
+    def __init__(
+            self, kind, url, path, fetch,
+            size=None, id=None, course_id=None, logger=None):
+        self.kind = kind
+        self.url = url
+        self.path = path
+        self.fetch = fetch
+        self.size = size
+        self.id = id
+        self.course_id = course_id
+        self.logger = logger
+
+
+class DownloadScheduler:
+    def __init__(self, priority=None, max_bandwidth=None):
+        self.priority = list(priority or DEFAULT_PRIORITY)
+        self.bucket = TokenBucket(max_bandwidth) if max_bandwidth else None
+        self._queue = []
+
+    def __len__(self):
+        return len(self._queue)
+
+    def add(self, download):
+        self._queue.append(download)
+
+    def throttle(self, n):
+        if self.bucket:
+            self.bucket.consume(n)
+
+    def drain(self, skip=()):
+        """Yield queued downloads in priority order, emptying the queue.
+
+        Downloads of a kind in `skip` are left queued for a later drain.
+
+        Downloads are grouped by the rank of their kind, then handed out
+        round robin between courses so one large course can't starve the
+        others. Within a course the smallest known sizes go first.
+        """
+        queue = [d for d in self._queue if d.kind not in skip]
+        self._queue = [d for d in self._queue if d.kind in skip]
+        ranks = {}
+        for d in queue:
+            rank = self._rank(d.kind)
+            courses = ranks.setdefault(rank, OrderedDict())
+            courses.setdefault(d.course_id, []).append(d)
+
+        for rank in sorted(ranks):
+            # Ties keep the order they were queued in
+            courses = [
+                deque(sorted(c, key=self._size_key))
+                for c in ranks[rank].values()]
+            while courses:
+                for c in courses:
+                    yield c.popleft()
+                courses = [c for c in courses if c]
+
+    def _rank(self, kind):
+        try:
+            return self.priority.index(kind)
+        except ValueError:
+            return len(self.priority)
+
+    @staticmethod
+    def _size_key(download):
+        # Unknown sizes sort after everything else
+        if download.size is None:
+            return (1, 0)
+        return (0, download.size)
@@ -5,11 +5,9 @@ import requests
 from requests.exceptions import MissingSchema
 import logging
 import json
-from tempfile import TemporaryFile
+from collections import Counter
 from pathvalidate import sanitize_filename
 import urllib
-from bs4 import BeautifulSoup
-from markdownify import markdownify as md
 from canvasapi import Canvas
 from canvasapi.exceptions import Unauthorized, ResourceDoesNotExist
 
@@ -18,6 +16,14 @@ from canvasapi.file import File
 from canvasapi.paginated_list import PaginatedList
 from canvasapi.util import combine_kwargs
 
+from canvas_file_scraper.journal import JOURNAL_NAME, FailureJournal
+from canvas_file_scraper.rendition import RenditionPolicy
+from canvas_file_scraper.state import STATE_NAME, SyncState
+from canvas_file_scraper.scheduler import (
+    BULK_KINDS, DEFAULT_PRIORITY, Download, DownloadScheduler)
+from canvas_file_scraper.writer import (
+    CHUNK_SIZE, DEFAULT_MAX_BUFFER, DiskWriter)
+
 
 class MediaObject(CanvasObject):
     pass
@@ -34,11 +40,24 @@ def get_media_objects(self, *args, **kwargs):
     )
 
 
+# Journal kinds for module items that can be retried on their own
+ITEM_KINDS = {
+    "File": "module_file",
+    "Page": "page",
+    "Assignment": "assignment",
+    "Quiz": "quiz",
+}
+
+# Journal kinds whose path is the downloaded file rather than a folder
+DOWNLOAD_KINDS = tuple(DEFAULT_PRIORITY)
+
 
 class CanvasScraper:
     def __init__(
             self, base_url, api_key, path, overwrite,
-            videos, markdown, logger=None):
+            videos, markdown, logger=None,
+            max_bandwidth=None, priority=None, on_error="journal",
+            rendition=None, max_buffer=None, preallocate=False):
         self.api_key = api_key
         self.base_url = self._create_base_url(base_url)
         self.headers = {'Authorization': f'Bearer {self.api_key}'}
@@ -48,8 +67,18 @@ class CanvasScraper:
         self.markdown = markdown
         self._logger = logger
         self._canvas = Canvas(self.base_url, self.api_key)
-        self.user = self._canvas.get_current_user()
+        self._user = None
         self.visited_page_links = []
+        self.scheduler = DownloadScheduler(priority, max_bandwidth)
+        self.journal = FailureJournal(os.path.join(path, JOURNAL_NAME))
+        self.state = SyncState(os.path.join(path, STATE_NAME))
+        self._course_ids = []
+        self.on_error = on_error
+        self.rendition = rendition or RenditionPolicy()
+        self.max_buffer = max_buffer or DEFAULT_MAX_BUFFER
+        self.preallocate = preallocate
+        self.writer = None
+        self._writing = []
 
         if not self._logger:
             self._logger = logging
@@ -60,14 +89,71 @@ class CanvasScraper:
 
     def scrape(self):
         courses = self.user.get_courses()
-        for c in courses:
-            try:
-                print(c)
-            except AttributeError:
-                print("Null course")
-            #import pdb
-            #pdb.set_trace()
-            self.recurse_course(c)
+        try:
+            for c in courses:
+                try:
+                    print(c)
+                except AttributeError:
+                    print("Null course")
+                #import pdb
+                #pdb.set_trace()
+                try:
+                    self.recurse_course(c)
+                except Exception as e:
+                    id = getattr(c, "id", None)
+                    self._fail("course", id, error=e, course_id=id)
+                # Documents land as soon as their course is walked, media
+                # waits so one course's videos can't hold up the others
+                self.run_downloads(skip=BULK_KINDS)
+            self.run_downloads()
+        except BaseException as e:
+            self._journal_pending(list(self.scheduler.drain()), e)
+            raise
+        for id in self._course_ids:
+            # Courses that failed this run keep their last good sync time
+            self.state.update_course(
+                id, self.journal.failures(id),
+                not self.journal.failures(id, new_only=True))
+        self.state.finish_run("scrape", len(self.journal))
+
+    def retry_failed(self):
+        records = self.journal.records()
+        self.logger.info(f"Retrying {len(records)} failed items")
+        for r in records:
+            self._retry(r)
+        self.run_downloads()
+        for id in {r["course_id"] for r in records}:
+            self.state.update_course(id, self.journal.failures(id), False)
+        self.state.finish_run("retry", len(self.journal))
+
+    def run_downloads(self, skip=()):
+        downloads = list(self.scheduler.drain(skip))
+        self.logger.info(f"Running {len(downloads)} queued downloads")
+        remaining = Counter(d.course_id for d in downloads)
+        self.writer = DiskWriter(
+            self.max_buffer, self.preallocate, self.logger)
+        try:
+            for i, d in enumerate(downloads):
+                try:
+                    self._run_download(d)
+                except BaseException as e:
+                    self._journal_pending(downloads[i:], e)
+                    raise
+                remaining[d.course_id] -= 1
+                if not remaining[d.course_id]:
+                    # Batch the fsyncs for a whole course
+                    self.writer.sync(d.course_id)
+        finally:
+            self.writer.close()
+            self._reap_writes(final=True)
+
+    def _journal_pending(self, downloads, error):
+        # Keep downloads that never got to run so --retry-failed picks
+        # them up
+        for d in downloads:
+            self.journal.record(
+                d.kind, d.id, url=d.url, path=d.path, error=error,
+                course_id=d.course_id)
 
     def recurse_course(self, course):
         try:
@@ -75,15 +161,20 @@ class CanvasScraper:
                 self.push(course, "course")
             except KeyError:
                 return
+            self.state.add_course(
+                course.id, getattr(course, "name", str(course.id)),
+                os.path.relpath(self.path, self._path))
+            self._course_ids.append(course.id)
 
             try:
                 external_tools = course.get_external_tools()
                 external_tools = list(external_tools)
                 self.logger.info(str(course.name))
                 self.logger.info(external_tools)
-                if external_tools:
-                    import pdb
-                    pdb.set_trace()
+                for t in external_tools:
+                    self.logger.warning(
+                        f"External tool '{getattr(t, 'name', t.id)}' "
+                        "is not supported, skipping")
             except (Unauthorized, ResourceDoesNotExist) as e:
                 self.logger.warning(e)
                 self.logger.warning(f"External tools not accesible")
@@ -95,6 +186,10 @@ class CanvasScraper:
                     self.push_raw(f"assignment_{a.name}", "assignment", 0)
                     try:
                         self.handle_assignment(a)
+                    except Exception as e:
+                        self._fail(
+                            "assignment", a.id, url=a.html_url, error=e,
+                            course_id=a.course_id, content_id=a.id)
                     finally:
                         self.pop()
             except (Unauthorized, ResourceDoesNotExist) as e:
@@ -110,6 +205,10 @@ class CanvasScraper:
                     self.push_raw(f"page_{p.title}", "page", 0)
                     try:
                         self.handle_page(p)
+                    except Exception as e:
+                        self._fail(
+                            "page", p.page_id, url=p.html_url, error=e,
+                            course_id=course.id, page_url=p.url)
                     finally:
                         self.pop()
             except (Unauthorized, ResourceDoesNotExist) as e:
@@ -173,7 +272,10 @@ class CanvasScraper:
                 # get_folders() returns a flat list of all folders
                 folders = obj.get_folders()
                 for f in folders:
-                    self.recurse_folder(f)
+                    try:
+                        self.recurse_folder(f)
+                    except Exception as e:
+                        self._fail("folder", f.id, error=e)
             except Unauthorized:
                 self.logger.warning(f"Files not accesible")
         finally:
@@ -187,13 +289,17 @@ class CanvasScraper:
                 obj.__class__.get_media_objects = get_media_objects
                 media_objs = obj.get_media_objects()
                 for m in media_objs:
-                    if "video" in m.media_type:
-                        self.handle_media_video(m)
-                    else:
-                        self.logger.warning(
-                            f"Media '{m.title}' type {m.media_type} is unsupported")
-                        import pdb
-                        pdb.set_trace()
+                    try:
+                        if "video" in m.media_type:
+                            self.handle_media_video(m)
+                        else:
+                            self.logger.warning(
+                                f"Media '{m.title}' type {m.media_type} "
+                                "is unsupported, skipping")
+                    except Exception as e:
+                        self._fail(
+                            "media_object", getattr(m, "media_id", None),
+                            error=e)
             except (Unauthorized, ResourceDoesNotExist) as e:
                 self.logger.warning(e)
                 self.logger.warning(f"Media objects not accesible")
@@ -209,22 +315,15 @@ class CanvasScraper:
                     try:
                         f_name = f.title
                     except AttributeError:
-                        try:
-                            f_name = f.display_name
-                        except Exception as e:
-                            import pdb
-                            pdb.set_trace()
+                        f_name = (
+                            getattr(f, "display_name", None)
+                            or getattr(f, "filename", None)
+                            or str(f.id))
 
                     f_path = os.path.join(self.path, f_name)
 
                     if self._should_write(f_path):
-                        self.logger.info(f"Downloading {f_path}")
-                        try:
-                            f.download(f_path)
-                            self.logger.info(f"{f_path} downloaded")
-                        except (Unauthorized, ResourceDoesNotExist) as e:
-                            self.logger.warning(f"file not accesible")
-                            self.logger.warning(str(e))
+                        self._queue_file(f, f_path)
             except (Unauthorized, ResourceDoesNotExist) as e:
                 self.logger.warning(f"folder not accesible")
                 self.logger.warning(str(e))
@@ -243,35 +342,43 @@ class CanvasScraper:
     def recurse_item(self, item):
         self.push(item, "item", name_key="title")
         try:
-            if item.type == "File":
-                self.logger.info("Handling file")
-                self.handle_file(item)
-            elif item.type == "Page":
-                self.logger.info("Handling page")
-                self.handle_page(item)
-            elif item.type == "Assignment":
-                self.logger.info("Handling assignment")
-                self.handle_assignment(item)
-            elif item.type == "Quiz":
-                self.logger.info("Handling quiz")
-                self.handle_quiz(item)
-            elif item.type == "SubHeader":
-                # TODO: Assuming you can't nest subheaders, it's probably enough
-                # to just pop the stack if the top contains a subheader, and then 
-                # push a new folder for each subheader.
-                self.logger.warning(
-                    "SubHeader's are not supported for now, skipping")
-                #self.handle_subheader(item)
-            elif item.type == "ExternalUrl":
-                self.logger.info("Handling external URL")
-                self.handle_external_url(item)
-            else:
-                self.logger.warning(f"Unsupported type {item.type}")
-                import pdb
-                pdb.set_trace()
+            self.handle_item(item)
+        except Exception as e:
+            kind = ITEM_KINDS.get(item.type, "item")
+            self._fail(
+                kind, item.id, url=getattr(item, "url", None), error=e,
+                course_id=item.course_id, type=item.type, title=item.title,
+                page_url=getattr(item, "page_url", None),
+                content_id=getattr(item, "content_id", None))
         finally:
             self.pop()
 
+    def handle_item(self, item):
+        if item.type == "File":
+            self.logger.info("Handling file")
+            self.handle_file(item)
+        elif item.type == "Page":
+            self.logger.info("Handling page")
+            self.handle_page(item)
+        elif item.type == "Assignment":
+            self.logger.info("Handling assignment")
+            self.handle_assignment(item)
+        elif item.type == "Quiz":
+            self.logger.info("Handling quiz")
+            self.handle_quiz(item)
+        elif item.type == "SubHeader":
+            # TODO: Assuming you can't nest subheaders, it's probably enough
+            # to just pop the stack if the top contains a subheader, and then 
+            # push a new folder for each subheader.
+            self.logger.warning(
+                "SubHeader's are not supported for now, skipping")
+            #self.handle_subheader(item)
+        elif item.type == "ExternalUrl":
+            self.logger.info("Handling external URL")
+            self.handle_external_url(item)
+        else:
+            self.logger.warning(f"Unsupported type {item.type}, skipping")
+
     def handle_external_url(self, item):
         file_path = os.path.join(self.path, f"{item.title}.txt")
         url = item.external_url
@@ -292,10 +399,17 @@ class CanvasScraper:
     def handle_media_video(self, item):
         media_name = item.title
         media_path = os.path.join(self.path, media_name)
-        sources = item.media_sources
-        sources.sort(key=lambda s: int(s['size']), reverse=True)
-        media_url = sources[0]['url']
-        self._dl(media_url, media_path)
+        rendition = self.rendition.select(item.media_sources)
+        if not rendition:
+            self._fail(
+                "media_object", getattr(item, "media_id", None),
+                error=f"No media source for '{media_name}' "
+                      "within the rendition limits")
+            return
+        if self._dl(
+                rendition.source['url'], media_path, kind="media",
+                size=rendition.size):
+            self.logger.info(f"Selected {rendition} for {media_name}")
 
     def handle_page(self, item):
         if getattr(item, "page_url", None):
@@ -304,7 +418,7 @@ class CanvasScraper:
             url = item.url
         else:
             self.logger.error("Could not get url for page item")
-            import pdb;pdb.set_trace()
+            return
         page = self._canvas.get_course(
             item.course_id).get_page(url)
         try:
@@ -330,7 +444,7 @@ class CanvasScraper:
             asn_id = item.id
         else:
             self.logger.error("Could not get url for assignment item")
-            import pdb;pdb.set_trace()
+            return
 
         page_path = os.path.join(self.path, "assignment.html")
         page_md_path = os.path.join(self.path, "assignment.md")
@@ -372,7 +486,7 @@ class CanvasScraper:
                 for a in attachments:
                     f_path = os.path.join(self.path, a["filename"])
                     url = a["url"]
-                    self._dl(url, f_path)
+                    self._dl(url, f_path, kind="attachment", size=a.get("size"))
             except AttributeError:
                 self.logger.warning("No attachments found")
 
@@ -413,6 +527,14 @@ class CanvasScraper:
             page += 1
         return objects
 
+    @property
+    def user(self):
+        # Authenticating is a network round trip, only pay for it once
+        # something actually needs Canvas
+        if not self._user:
+            self._user = self._canvas.get_current_user()
+        return self._user
+
     @property
     def logger(self):
         return self._loggers[-1]
@@ -422,6 +544,11 @@ class CanvasScraper:
         return os.path.join(
             self._path, *[sanitize_filename(n) for n in self._names])
 
+    @property
+    def course_id(self):
+        # The course is always at the bottom of the stack
+        return self._ids[0] if self._ids else None
+
     @property
     def name(self):
         return self._names[-1]
@@ -458,29 +585,212 @@ class CanvasScraper:
             str(flavor_id),
             "format/applehttp/protocol/https/a.m3u8")
 
-    def _get(self, url, params=None):
-        return requests.get(url, params=params, headers=self.headers)
+    def _kaltura_download_url(self, base_url, entry_id, flavor_id, ext):
+        base_url = base_url[:base_url.index("embedIframeJs")]
+        return os.path.join(
+            base_url,
+            "playManifest/entryId",
+            str(entry_id),
+            "flavorId",
+            str(flavor_id),
+            f"format/url/protocol/https/a.{ext}")
+
+    def _get(self, url, params=None, stream=False):
+        return requests.get(
+            url, params=params, headers=self.headers, stream=stream)
 
     def _mkd(self, path):
         return os.makedirs(path, exist_ok=True)
 
-    def _dl(self, url, path):
+    def _dl(self, url, path, kind="link", size=None):
         if self._should_write(path):
+            self._queue(
+                kind, url, path, lambda: self._stream(url, path, size), size)
+            return True
+
+    def _queue(self, kind, url, path, fetch, size=None, id=None):
+        self.logger.info(f"Queueing {kind} {path}")
+        self.scheduler.add(Download(
+            kind, url, path, fetch, size=size, id=id,
+            course_id=self.course_id, logger=self.logger))
+
+    def _queue_file(self, file, path):
+        url = file.url
+        size = getattr(file, "size", None)
+        self._queue(
+            "file", url, path, lambda: self._stream(url, path, size),
+            size, file.id)
+
+    def _run_download(self, download):
+        # Downloads run after the scrape has unwound, so restore the
+        # logger that was active when the download was queued
+        self._loggers.append(download.logger)
+        self._ids.append(download.course_id)
+        try:
+            self.logger.info(f"Downloading {download.path}")
+            handle = download.fetch()
+            self._writing.append((download, handle))
+        except MissingSchema:
+            self._fail_download(
+                download, f"{download.url} is not a valid url")
+        except Exception as e:
+            self._fail_download(download, e)
+        finally:
+            self._ids.pop(-1)
+            self._loggers.pop(-1)
+        self._reap_writes()
+
+    def _reap_writes(self, final=False):
+        # Settle downloads the writer has finished with, the rest are
+        # checked again after the next download
+        writing = []
+        for download, handle in self._writing:
+            unfinished = handle and not handle.done.is_set()
+            if unfinished and not final:
+                writing.append((download, handle))
+                continue
+            self._loggers.append(download.logger)
             try:
-                self.logger.info(f"Downloading {path}")
-                r = self._get(url)
-                with open(path, "wb") as f:
-                    f.write(r.content)
-                    self.logger.info(f"{path} downloaded")
-                    return True
-            except MissingSchema as e:
-                self.logger.error(f"{url} is not a valid url")
-                return False
+                if unfinished:
+                    self._fail_download(
+                        download, "Disk writer stopped before finishing")
+                elif handle and handle.error:
+                    self._fail_download(download, handle.error)
+                else:
+                    self.logger.info(f"{download.path} downloaded")
+                    self.journal.resolve(self.journal.key(
+                        download.kind, download.id, download.path))
+            finally:
+                self._loggers.pop(-1)
+        self._writing = writing
+
+    def _fail_download(self, download, error):
+        self._fail(
+            download.kind, download.id, url=download.url,
+            path=download.path, error=error, course_id=download.course_id)
+
+    def _fail(
+            self, kind, id=None, url=None, path=None, error=None,
+            course_id=None, **data):
+        self.logger.error(f"{kind} {id if id is not None else url} failed")
+        self.logger.error(error)
+        self.journal.record(
+            kind, id, url=url, path=path or self.path, error=error,
+            course_id=course_id or self.course_id, data=data)
+        if self.on_error == "debug":
+            import pdb
+            pdb.set_trace()
+
+    def _retry(self, record):
+        kind = record["kind"]
+        retry = getattr(self, f"_retry_{kind}", None)
+        if not retry:
+            # Leave it journaled, only a full scrape can tell if it's fixed
+            self.logger.warning(
+                f"{kind} {record['id']} can't be retried on its own, "
+                f"skipping it: {record['error']}")
+            return
+
+        # Rebuild the stack the item failed under so it lands in place
+        path = record["path"]
+        if kind in DOWNLOAD_KINDS:
+            path = os.path.dirname(path)
+        rel_path = os.path.relpath(path, self._path)
+        self._names = [] if rel_path == "." else rel_path.split(os.sep)
+        self._ids = [record["course_id"]]
+        self._push_logger(f"retry_{kind}")
+        try:
+            self.logger.info(f"Retrying {kind} {record['path']}")
+            try:
+                queued = retry(record)
             except Exception as e:
-                self.logger.error("file download failed")
-                import pdb
-                pdb.set_trace()
-                self.logger.error(e)
+                self._fail(
+                    kind, record["id"], url=record["url"],
+                    path=record["path"], error=e,
+                    course_id=record["course_id"], **record["data"])
+                return
+            if kind in DOWNLOAD_KINDS:
+                # Queued downloads resolve themselves once they finish,
+                # anything skipped is already on disk
+                if not queued:
+                    self.journal.resolve(record["key"])
+            elif record["key"] not in self.journal.recorded:
+                self.journal.resolve(record["key"])
+        finally:
+            self._pop_logger()
+            self._names = []
+            self._ids = []
+
+    def _retry_file(self, record):
+        if not self._should_write(record["path"]):
+            return
+        # Download urls expire, so grab a fresh one
+        file = self._canvas.get_file(record["id"])
+        self._queue_file(file, record["path"])
+        return True
+
+    def _retry_attachment(self, record):
+        return self._dl(record["url"], record["path"], kind="attachment")
+
+    def _retry_link(self, record):
+        return self._dl(record["url"], record["path"])
+
+    def _retry_media(self, record):
+        return self._dl(record["url"], record["path"], kind="media")
+
+    def _retry_video(self, record):
+        return self._dl_video(record["url"], record["path"])
+
+    def _retry_course(self, record):
+        self.recurse_course(self._canvas.get_course(record["id"]))
+
+    def _retry_folder(self, record):
+        self.recurse_folder(self._canvas.get_folder(record["id"]))
+
+    def _retry_media_object(self, record):
+        course = self._canvas.get_course(record["course_id"])
+        course.__class__.get_media_objects = get_media_objects
+        media_obj = next(
+            (m for m in course.get_media_objects()
+             if getattr(m, "media_id", None) == record["id"]),
+            None)
+        if not media_obj:
+            raise ResourceDoesNotExist(
+                f"Media object {record['id']} no longer exists")
+        self.handle_media_video(media_obj)
+
+    def _retry_page(self, record):
+        self.handle_page(self._record_to_item(record))
+
+    def _retry_assignment(self, record):
+        self.handle_assignment(self._record_to_item(record))
+
+    def _retry_quiz(self, record):
+        self.handle_quiz(self._record_to_item(record))
+
+    def _retry_module_file(self, record):
+        item = self._record_to_item(record)
+        item.url = record["url"]
+        self.handle_file(item)
+
+    def _record_to_item(self, record):
+        item = types.SimpleNamespace(**record["data"])
+        item.course_id = record["course_id"]
+        item._requester = self.user._requester
+        return item
+
+    def _stream(self, url, path, size=None, auth=True):
+        # Only Canvas should ever see the API key
+        get = self._get if auth else requests.get
+        with get(url, stream=True) as r:
+            r.raise_for_status()
+            # The writer finishes in the background, errors are picked
+            # up from the handle later
+            with self.writer.open(path, size, self.course_id) as f:
+                for chunk in r.iter_content(chunk_size=CHUNK_SIZE):
+                    self.scheduler.throttle(len(chunk))
+                    f.write(chunk)
+        return f
 
     def _dl_page(self, page, path):
         if self._should_write(path):
@@ -500,6 +810,8 @@ class CanvasScraper:
         with open(src_path, "r") as f:
             src = f.read()
 
+        # Imported here so runs that never touch pages don't pay for it
+        from bs4 import BeautifulSoup
         soup = BeautifulSoup(src, "html.parser")
         links = soup.find_all('a')
 
@@ -540,8 +852,11 @@ class CanvasScraper:
                 self.push_raw(f"page_{page_item.page_url}", "page", 0)
                 try:
                     self.handle_page(page_item)
-                except:
-                    self.logger.info("Could not handle page item")
+                except Exception as e:
+                    self._fail(
+                        "page", url=href, error=e,
+                        course_id=page_item.course_id,
+                        page_url=page_item.page_url)
                 finally:
                     self.pop()
             elif self._is_assignment_url(href):
@@ -550,8 +865,11 @@ class CanvasScraper:
                 self.push_raw(f"assignment_{assignment_item.content_id}", "assignment", 0)
                 try:
                     self.handle_assignment(assignment_item)
-                except:
-                    self.logger.info("Could not handle assignment item")
+                except Exception as e:
+                    self._fail(
+                        "assignment", url=href, error=e,
+                        course_id=assignment_item.course_id,
+                        content_id=assignment_item.content_id)
                 finally:
                     self.pop()
             else:
@@ -575,20 +893,24 @@ class CanvasScraper:
         dl_path = os.path.join(path, file.filename)
         if not self._should_write(dl_path):
             return
-        file.download(dl_path)
-        self.logger.info(f"{dl_path} downloaded")
+        self._queue_file(file, dl_path)
         return True
 
     def _dl_video(self, base_url, path):
         if not self._should_write(path):
             return
+        self._queue(
+            "video", base_url, path,
+            lambda: self._fetch_video(base_url, path))
+        return True
+
+    def _fetch_video(self, base_url, path):
         # Get data from Kaltura iframe
         lines = requests.get(base_url).text.splitlines()
         iframe_data = next(
             (l for l in lines if "kalturaIframePackageData" in l), None)
         if not iframe_data:
-            self.logger.warning(f"iframe data not found for {base_url}")
-            return
+            raise ValueError(f"iframe data not found for {base_url}")
         # Ignore js syntax, pull json text out of line
         iframe_data = iframe_data[iframe_data.index("{"):-1]
         iframe_data = json.loads(iframe_data)
@@ -597,44 +919,50 @@ class CanvasScraper:
                                         ["contextData"]
                                         ["flavorAssets"])
         except KeyError:
-            self.logger.warning(f"flavorAssets not found in {base_url}")
-            return
+            raise ValueError(f"flavorAssets not found in {base_url}")
 
-        flavor_asset = next(
-            (f for f in flavor_assets if f.get("flavorParamsId") == 5),
-            None)
-        if not flavor_asset:
-            self.logger.warning(
-                f"Could not find correct flavorAsset for {base_url}")
-            return
+        rendition = self.rendition.select_flavor(flavor_assets)
+        if not rendition:
+            raise ValueError(
+                f"No flavorAsset within the rendition limits for {base_url}")
         try:
-            entry_id = flavor_asset["entryId"]
-            flavor_id = flavor_asset["id"]
+            entry_id = rendition.source["entryId"]
+            flavor_id = rendition.source["id"]
         except KeyError:
-            self.logger.warning(
+            raise ValueError(
                 f"Could not find keys inside flavorAsset for {base_url}")
-            return
+        self.logger.info(f"Selected {rendition} for {path}")
+        # Embeds are always saved as .mp4, so only take the progressive
+        # path when that's what it really is
+        if (rendition.container == "mp4"
+                and self.rendition.is_progressive(rendition)):
+            # A single progressive file beats fetching every HLS segment
+            return self._stream(
+                self._kaltura_download_url(
+                    base_url, entry_id, flavor_id, rendition.container),
+                path, rendition.size, auth=False)
         manifest_url = self._kaltura_manifest_url(
             base_url, entry_id, flavor_id)
         lines = requests.get(manifest_url).text.splitlines()
         index_url = next((l for l in lines if "index" in l), None)
         if not index_url:
-            self.logger.warning(
+            raise ValueError(
                 f"Could not find index urlfor {base_url}")
-            return
         index = filter(
             lambda l: not l.startswith("#"),
             requests.get(index_url).text.splitlines())
         streaming_url = index_url.replace("index.m3u8", "")
-        with TemporaryFile() as tf:
+        # Segments arrive in order, so they can go straight to the writer
+        with self.writer.open(path, rendition.size, self.course_id) as f:
             for i in index:
                 self.logger.info(f"Downloading video segment {i}")
                 segment_url = os.path.join(streaming_url, i)
-                tf.write(requests.get(segment_url).content)
-            with open(path, "wb") as f:
-                tf.seek(0)
-                f.write(tf.read())
-            self.logger.info(f"Downloaded {path} successfully")
+                with requests.get(segment_url, stream=True) as r:
+                    r.raise_for_status()
+                    for chunk in r.iter_content(chunk_size=CHUNK_SIZE):
+                        self.scheduler.throttle(len(chunk))
+                        f.write(chunk)
+        return f
 
     def _is_page_url(self, url):
         page_regex = re.compile(r".+courses/\d+/pages/.+")
@@ -669,6 +997,7 @@ class CanvasScraper:
             self.logger.info(f"Converting {src_path} to markdown")
             with open(src_path, "r") as f:
                 src = f.read()
+            from markdownify import markdownify as md
             with open(dest_path, "w") as f:
                 f.writelines(md(src))
 
@@ -0,0 +1,99 @@
+import os
+import json
+from datetime import datetime
+
+from canvas_file_scraper.util import dump_json_atomic
+
+
+STATE_NAME = ".state.json"
+
+
+def list_files(path):
+    """Yield (relative path, size, mtime) for every downloaded file."""
+    for root, dirs, files in os.walk(path):
+        dirs[:] = sorted(d for d in dirs if not d.startswith("."))
+        for f in sorted(files):
+            if f.startswith(".") or f.endswith(".part"):
+                continue
+            full_path = os.path.join(root, f)
+            stat = os.stat(full_path)
+            yield os.path.relpath(full_path, path), stat.st_size, stat.st_mtime
+
+
+class SyncState:
+    """What has been scraped into a download directory and when.
+
+    This is kept small enough that status checks only need to read one
+    json file, no Canvas client or directory walk required.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.directory = os.path.dirname(path)
+        self._state = {"courses": {}, "last_run": None}
+        if os.path.isfile(path):
+            with open(path, "r") as f:
+                self._state = json.load(f)
+
+    def __bool__(self):
+        return os.path.isfile(self.path)
+
+    @property
+    def last_run(self):
+        return self._state["last_run"]
+
+    def courses(self):
+        return list(self._state["courses"].values())
+
+    def find_course(self, query):
+        """Find a course by id, exact name or unique name fragment."""
+        courses = self.courses()
+        for c in courses:
+            if query in (str(c["id"]), c["name"]):
+                return c
+        matches = [c for c in courses if query.lower() in c["name"].lower()]
+        if len(matches) == 1:
+            return matches[0]
+        return None
+
+    def add_course(self, id, name, path):
+        course = self._state["courses"].setdefault(str(id), {
+            "id": id,
+            "last_synced": None,
+            "files": 0,
+            "bytes": 0,
+            "failures": 0,
+        })
+        course["name"] = name
+        course["path"] = path
+
+    def update_course(self, id, failures, synced):
+        """Record a course's outstanding failures.
+
+        The sync time and file counts only move on if it synced cleanly.
+        """
+        course = self._state["courses"].get(str(id))
+        if not course:
+            return
+        course["failures"] = failures
+        if synced:
+            files = list(list_files(
+                os.path.join(self.directory, course["path"])))
+            course["last_synced"] = self._now()
+            course["files"] = len(files)
+            course["bytes"] = sum(size for _, size, _ in files)
+
+    def finish_run(self, mode, failures):
+        self._state["last_run"] = {
+            "mode": mode,
+            "finished": self._now(),
+            "failures": failures,
+        }
+        self.save()
+
+    def save(self):
+        dump_json_atomic(self._state, self.path)
+
+    @staticmethod
+    def _now():
+        return datetime.now().isoformat(timespec="seconds")
@@ -0,0 +1,13 @@
+import os
+import json
+
+
+def dump_json_atomic(obj, path):
+    """Write obj as json so readers only ever see the old or new file."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(obj, f, indent=2, default=str)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
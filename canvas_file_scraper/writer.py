@@ -0,0 +1,195 @@
+import os
+import queue
+import logging
+import threading
+
+
+CHUNK_SIZE = 64 * 1024
+DEFAULT_MAX_BUFFER = 32 * 1024 * 1024
+
+
+class WriteHandle:
+    """A file being written by a DiskWriter.
+
+    Writes are queued and return straight away. The file is written to
+    `<path>.part` and only renamed into place once it's closed, `done` is
+    set once that has happened or the write failed with `error`.
+    """
+
+    def __init__(self, writer, path, size=None, course_id=None):
+        self.path = path
+        self.part_path = f"{path}.part"
+        self.size = size
+        self.course_id = course_id
+        self.error = None
+        self.done = threading.Event()
+        self._writer = writer
+        self._file = None
+        self._written = 0
+
+    def write(self, data):
+        self._writer._put(self, "write", data)
+
+    def close(self):
+        self._writer._put(self, "close")
+
+    def abort(self):
+        self._writer._put(self, "abort")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type:
+            self.abort()
+        else:
+            self.close()
+
+
+class DiskWriter:
+    """Write-behind stage between network reads and the disk.
+
+    A single background thread does all the writing so slow disks don't
+    hold up downloads. Memory use is bounded by `max_buffer`, writers block
+    once that much data is queued. Finished files are only fsynced when
+    `sync()` is called for their course.
+
+    Preallocation is off by default, on filesystems without native support
+    (e.g. many NFS mounts) glibc emulates it by writing every block.
+    """
+
+    def __init__(
+            self, max_buffer=DEFAULT_MAX_BUFFER, preallocate=False,
+            logger=None):
+        self.preallocate = preallocate
+        self._logger = logger or logging.getLogger(__name__)
+        self._queue = queue.Queue(maxsize=max(1, max_buffer // CHUNK_SIZE))
+        self._unsynced = {}
+        self._thread = None
+
+    def open(self, path, size=None, course_id=None):
+        handle = WriteHandle(self, path, size, course_id)
+        self._put(handle, "open")
+        return handle
+
+    def sync(self, course_id=None):
+        self._put(None, "sync", course_id)
+
+    def sync_all(self):
+        self._put(None, "sync_all")
+
+    def close(self):
+        if self._thread:
+            if self._thread.is_alive():
+                self.sync_all()
+                self._put(None, "stop")
+            self._thread.join()
+            self._thread = None
+
+    def _put(self, handle, op, data=None):
+        if not self._thread:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        # Never block forever on a queue nobody is reading any more
+        while True:
+            try:
+                self._queue.put((handle, op, data), timeout=1)
+                return
+            except queue.Full:
+                if not self._thread.is_alive():
+                    raise RuntimeError("Disk writer stopped unexpectedly")
+
+    def _run(self):
+        while True:
+            handle, op, data = self._queue.get()
+            try:
+                if op == "stop":
+                    return
+                elif op == "sync":
+                    self._sync(self._unsynced.pop(data, []))
+                elif op == "sync_all":
+                    unsynced, self._unsynced = self._unsynced, {}
+                    self._sync(p for paths in unsynced.values() for p in paths)
+                else:
+                    self._handle(handle, op, data)
+            except Exception as e:
+                # Keep the thread alive, anyone waiting on it would hang
+                self._logger.error(f"Disk writer {op} failed: {e}")
+                if handle:
+                    handle.error = handle.error or e
+                    if op in ("close", "abort"):
+                        handle.done.set()
+            finally:
+                self._queue.task_done()
+
+    def _handle(self, handle, op, data):
+        if op in ("close", "abort"):
+            self._finish(handle, op == "close")
+            return
+        if handle.error:
+            return
+        try:
+            if op == "open":
+                handle._file = open(handle.part_path, "wb")
+                if self.preallocate and handle.size:
+                    self._preallocate(handle._file.fileno(), handle.size)
+            elif op == "write":
+                handle._file.write(data)
+                handle._written += len(data)
+        except Exception as e:
+            handle.error = e
+
+    def _finish(self, handle, keep):
+        try:
+            if handle._file:
+                if keep and not handle.error:
+                    # Sizes reported by Canvas are only estimates for media
+                    handle._file.truncate(handle._written)
+                handle._file.close()
+            if keep and not handle.error:
+                os.replace(handle.part_path, handle.path)
+                self._unsynced.setdefault(
+                    handle.course_id, []).append(handle.path)
+        except Exception as e:
+            handle.error = e
+        finally:
+            handle._file = None
+            if not keep or handle.error:
+                try:
+                    os.remove(handle.part_path)
+                except OSError:
+                    pass
+            handle.done.set()
+
+    def _sync(self, paths):
+        dirs = set()
+        for path in paths:
+            try:
+                self._fsync(path)
+                dirs.add(os.path.dirname(path) or ".")
+            except OSError as e:
+                self._logger.warning(f"Could not sync {path}: {e}")
+        # Make the renames durable too
+        for d in dirs:
+            try:
+                self._fsync(d)
+            except OSError:
+                pass
+
+    @staticmethod
+    def _fsync(path):
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    @staticmethod
+    def _preallocate(fd, size):
+        if not hasattr(os, "posix_fallocate"):
+            return
+        try:
+            os.posix_fallocate(fd, 0, size)
+        except OSError:
+            # Not every filesystem supports it, it's only an optimization
+            pass
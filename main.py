@@ -1,31 +1,114 @@
 import argparse
 import logging
 import sys
-import requests
 import os
-import pprint
-import json
-from bs4 import BeautifulSoup
-import re
-from canvas_file_scraper.scraper import CanvasScraper
+from datetime import datetime
+from canvas_file_scraper.scheduler import (
+    DEFAULT_PRIORITY, parse_priority, parse_size)
+from canvas_file_scraper.rendition import (
+    DEFAULT_PREFERRED_HEIGHT, RenditionPolicy)
+from canvas_file_scraper.journal import JOURNAL_NAME, FailureJournal
+from canvas_file_scraper.state import STATE_NAME, SyncState, list_files
 
 log_formatter = logging.Formatter(
     "[%(levelname)-5.5s][%(name)s] %(message)s")
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.DEBUG)
 
-file_handler = logging.FileHandler("scraper.log")
-file_handler.setFormatter(log_formatter)
-logger.addHandler(file_handler)
-
 console_handler = logging.StreamHandler(sys.stdout)
 console_handler.setFormatter(log_formatter)
 logger.addHandler(console_handler)
 
 
+OFFLINE_COMMANDS = ("status", "ls")
+
+
+def add_file_handler():
+    # Only scrapes log to disk, offline checks shouldn't leave files behind
+    file_handler = logging.FileHandler("scraper.log")
+    file_handler.setFormatter(log_formatter)
+    logger.addHandler(file_handler)
+
+
+def format_size(size):
+    for unit in ("B", "K", "M", "G"):
+        if size < 1024 or unit == "G":
+            break
+        size /= 1024
+    return f"{size:.1f}{unit}" if unit != "B" else f"{size}B"
+
+
+def status(args):
+    state = SyncState(os.path.join(args.directory, STATE_NAME))
+    if not state:
+        print(f"No scrape found in {args.directory}")
+        return 1
+    last_run = state.last_run
+    if last_run:
+        print(f"Last run: {last_run['mode']} finished {last_run['finished']}")
+    journal = FailureJournal(os.path.join(args.directory, JOURNAL_NAME))
+    print(f"Failed items: {len(journal)}")
+    print()
+    print(
+        f"{'ID':>8}  {'Last synced':<19}  {'Files':>6}  {'Size':>8}  "
+        f"{'Failed':>6}  Name")
+    for c in sorted(state.courses(), key=lambda c: c["name"]):
+        print(
+            f"{c['id']:>8}  {c['last_synced'] or 'never':<19}  "
+            f"{c['files']:>6}  {format_size(c['bytes']):>8}  "
+            f"{c.get('failures', 0):>6}  {c['name']}")
+    return 0
+
+
+def ls(args):
+    state = SyncState(os.path.join(args.directory, STATE_NAME))
+    course = state.find_course(args.course)
+    if not course:
+        print(f"No course matching '{args.course}' in {args.directory}")
+        return 1
+    print(f"{course['name']} (last synced {course['last_synced'] or 'never'})")
+    for path, size, mtime in list_files(
+            os.path.join(args.directory, course["path"])):
+        mtime = datetime.fromtimestamp(mtime).isoformat(timespec="seconds")
+        print(f"{format_size(size):>8}  {mtime}  {path}")
+    return 0
+
+
+def offline_main(argv):
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument(
+        '-d', '--directory', type=str, default='./files',
+        help='Directory files were stored in (default: ./files)')
+    parser = argparse.ArgumentParser(
+            description='Reports on previous scrapes without contacting Canvas')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser(
+        'status', parents=[common],
+        help='Show when each course was last synced')
+    ls_parser = subparsers.add_parser(
+        'ls', parents=[common], help='List downloaded files for a course')
+    ls_parser.add_argument(
+        'course', type=str, help='Course id or (part of its) name')
+
+    args = parser.parse_args(argv)
+    if args.command == 'status':
+        return status(args)
+    return ls(args)
+
+
 def main():
+    # Offline commands skip the Canvas client entirely so they stay fast
+    if len(sys.argv) > 1 and sys.argv[1] in OFFLINE_COMMANDS:
+        sys.exit(offline_main(sys.argv[1:]))
+
     parser = argparse.ArgumentParser(
-            description='Grabs all files for all courses on Canvas')
+            description='Grabs all files for all courses on Canvas',
+            formatter_class=argparse.RawDescriptionHelpFormatter,
+            epilog='offline commands (no API key or Canvas access needed):\n'
+                   '  status [-d DIR]         show when each course was '
+                   'last synced\n'
+                   '  ls COURSE [-d DIR]      list downloaded files for '
+                   'a course')
     parser.add_argument(
         'canvas_api_key', metavar='key', type=str,
         help='Canvas API Key obtained from "settings"')
@@ -44,8 +127,56 @@ def main():
     parser.add_argument(
         '-m', '--markdown', action="store_true",
         help='Convert downloaded pages to markdown')
+    parser.add_argument(
+        '--max-resolution', type=int, default=None,
+        help='Highest video height to download, videos without a small '
+             'enough rendition are skipped. 0 picks the best available '
+             f'(default: prefer {DEFAULT_PREFERRED_HEIGHT}p, else the '
+             'smallest rendition)')
+    parser.add_argument(
+        '--max-bitrate', type=int, default=None,
+        help='Highest video bitrate to download in kbps (default: best)')
+    parser.add_argument(
+        '--max-video-size', type=parse_size, default=None,
+        help='Largest video rendition to download, accepts K/M/G suffixes '
+             '(default: unlimited)')
+    parser.add_argument(
+        '--original', action='store_true',
+        help='Allow downloading the original uploaded video file '
+             '(usually much larger than the transcodes)')
+    parser.add_argument(
+        '--container', type=str, default='mp4',
+        help='Preferred video container, downloaded progressively '
+             'when available (default: mp4)')
+    parser.add_argument(
+        '-b', '--max-bandwidth', type=parse_size, default=None,
+        help='Cap download speed in bytes/s, accepts K/M/G suffixes '
+             '(default: unlimited)')
+    parser.add_argument(
+        '-p', '--priority', type=parse_priority,
+        default=DEFAULT_PRIORITY,
+        help='Comma separated download order by kind '
+             f'(default: {",".join(DEFAULT_PRIORITY)})')
+    parser.add_argument(
+        '--max-buffer', type=parse_size, default=None,
+        help='Memory to buffer between downloads and disk writes, accepts '
+             'K/M/G suffixes (default: 32M)')
+    parser.add_argument(
+        '--preallocate', action='store_true',
+        help='Preallocate files to their reported size, avoid on NFS '
+             'mounts without native fallocate support')
+    parser.add_argument(
+        '-e', '--on-error', type=str, default='journal',
+        choices=['journal', 'debug'],
+        help='Record failed items in the failure journal and carry on, '
+             'or drop into pdb (default: journal)')
+    parser.add_argument(
+        '-r', '--retry-failed', action='store_true',
+        help='Only retry items recorded in the failure journal')
 
     args = parser.parse_args()
+    add_file_handler()
+    from canvas_file_scraper.scraper import CanvasScraper
     scraper = CanvasScraper(
         args.canvas_url,
         args.canvas_api_key,
@@ -53,10 +184,31 @@ def main():
         args.overwrite,
         args.video,
         args.markdown,
-        logger)
+        logger,
+        max_bandwidth=args.max_bandwidth,
+        priority=args.priority,
+        on_error=args.on_error,
+        rendition=RenditionPolicy(
+            args.max_resolution or None,
+            args.max_bitrate,
+            args.max_video_size,
+            args.container,
+            args.original,
+            DEFAULT_PREFERRED_HEIGHT if args.max_resolution is None
+            else None),
+        max_buffer=args.max_buffer,
+        preallocate=args.preallocate)
 
-    logger.info("Starting scrape")
-    scraper.scrape()
+    if args.retry_failed:
+        logger.info("Retrying failed items")
+        scraper.retry_failed()
+    else:
+        logger.info("Starting scrape")
+        scraper.scrape()
+    if scraper.journal:
+        logger.warning(
+            f"{len(scraper.journal)} items failed, "
+            f"see {scraper.journal.path}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,51 @@
+import json
+
+from canvas_file_scraper.journal import FailureJournal
+
+
+def test_record_counts_attempts(tmp_path):
+    journal = FailureJournal(str(tmp_path / "failures.json"))
+
+    key = journal.record("file", 1, path="a.pdf", error=ValueError("boom"))
+    journal.record("file", 1, path="a.pdf", error="again")
+
+    records = journal.records()
+    assert len(records) == 1
+    assert records[0]["key"] == key == FailureJournal.key("file", 1, "a.pdf")
+    assert records[0]["attempts"] == 2
+    assert records[0]["error"] == "again"
+
+
+def test_record_formats_exceptions(tmp_path):
+    journal = FailureJournal(str(tmp_path / "failures.json"))
+
+    journal.record("link", url="x", path="b", error=ValueError("boom"))
+
+    assert journal.records()[0]["error"] == "ValueError: boom"
+
+
+def test_records_survive_reload(tmp_path):
+    path = str(tmp_path / "failures.json")
+    journal = FailureJournal(path)
+    journal.record(
+        "page", 2, path="dir", course_id=3, data={"page_url": "intro"})
+
+    reloaded = FailureJournal(path)
+    assert len(reloaded) == 1
+    assert reloaded.records()[0]["data"] == {"page_url": "intro"}
+    assert reloaded.records()[0]["course_id"] == 3
+    assert not reloaded.recorded
+
+
+def test_resolve_removes_record(tmp_path):
+    path = tmp_path / "failures.json"
+    journal = FailureJournal(str(path))
+    key = journal.record("file", 1, path="a.pdf")
+    journal.record("file", 2, path="b.pdf")
+
+    journal.resolve(key)
+    journal.resolve("missing")
+
+    assert len(journal) == 1
+    assert list(json.loads(path.read_text())) == [
+        FailureJournal.key("file", 2, "b.pdf")]
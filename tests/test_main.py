@@ -0,0 +1,63 @@
+import main
+from canvas_file_scraper.journal import JOURNAL_NAME, FailureJournal
+from canvas_file_scraper.state import STATE_NAME, SyncState
+
+
+def scraped(tmp_path):
+    course_dir = tmp_path / "Physics 101" / "files"
+    course_dir.mkdir(parents=True)
+    (course_dir / "notes.pdf").write_bytes(b"x" * 2048)
+    state = SyncState(str(tmp_path / STATE_NAME))
+    state.add_course(12, "Physics 101", "Physics 101")
+    state.add_course(13, "Chemistry 101", "Chemistry 101")
+    state.update_course(12, 0, True)
+    state.update_course(13, 1, False)
+    state.finish_run("scrape", 1)
+    FailureJournal(str(tmp_path / JOURNAL_NAME)).record(
+        "file", 1, path="x", course_id=13)
+    return str(tmp_path)
+
+
+def test_format_size():
+    assert main.format_size(512) == "512B"
+    assert main.format_size(2048) == "2.0K"
+    assert main.format_size(3 * 1024 ** 3) == "3.0G"
+
+
+def test_status(tmp_path, capsys):
+    assert main.offline_main(["status", "-d", scraped(tmp_path)]) == 0
+
+    out = capsys.readouterr().out.splitlines()
+    assert out[0].startswith("Last run: scrape finished")
+    assert out[1] == "Failed items: 1"
+    chemistry, physics = out[4:]
+    assert chemistry.split()[:5] == ["13", "never", "0", "0B", "1"]
+    assert physics.split()[2:5] == ["1", "2.0K", "0"]
+    assert physics.endswith("Physics 101")
+
+
+def test_status_without_scrape(tmp_path, capsys):
+    assert main.offline_main(["status", "-d", str(tmp_path)]) == 1
+    assert "No scrape found" in capsys.readouterr().out
+
+
+def test_ls(tmp_path, capsys):
+    assert main.offline_main(["ls", "phys", "-d", scraped(tmp_path)]) == 0
+
+    out = capsys.readouterr().out.splitlines()
+    assert out[0].startswith("Physics 101 (last synced ")
+    assert out[1].split()[0] == "2.0K"
+    assert out[1].endswith("files/notes.pdf")
+
+
+def test_ls_unknown_course(tmp_path, capsys):
+    assert main.offline_main(["ls", "101", "-d", scraped(tmp_path)]) == 1
+    assert "No course matching '101'" in capsys.readouterr().out
+
+
+def test_offline_commands_leave_no_log(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+
+    main.offline_main(["status", "-d", str(tmp_path)])
+
+    assert not (tmp_path / "scraper.log").exists()
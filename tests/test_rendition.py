@@ -0,0 +1,91 @@
+from canvas_file_scraper.rendition import Rendition, RenditionPolicy
+
+
+SOURCES = [
+    {"height": "1080", "bitrate": "4000", "size": "500000", "fileExt": "mp4"},
+    {"height": "720", "bitrate": "2000", "size": "200000", "fileExt": "mp4"},
+    {"height": "720", "bitrate": "2500", "size": "190000", "fileExt": "webm"},
+    {"height": "360", "size": "50000", "content_type": "video/mp4"},
+]
+
+
+def describe(rendition):
+    return (rendition.height, rendition.container)
+
+
+def test_rendition_reads_media_sources():
+    rendition = Rendition(SOURCES[3])
+
+    assert rendition.height == 360
+    assert rendition.bitrate is None
+    assert rendition.size == 50000 * 1024
+    assert rendition.container == "mp4"
+    assert not rendition.is_original
+
+
+def test_default_policy_prefers_720p():
+    assert describe(RenditionPolicy().select(SOURCES)) == (720, "mp4")
+
+
+def test_default_policy_falls_back_to_smallest():
+    sources = [
+        {"height": "1440", "size": "900000", "fileExt": "mp4"},
+        {"height": "1080", "size": "500000", "fileExt": "mp4"},
+    ]
+
+    assert describe(RenditionPolicy().select(sources)) == (1080, "mp4")
+    assert RenditionPolicy(max_height=720).select(sources) is None
+
+
+def test_hard_limit_replaces_preferred_height():
+    policy = RenditionPolicy(max_height=1080)
+
+    assert describe(policy.select(SOURCES)) == (1080, "mp4")
+
+
+def test_no_limits_picks_best():
+    policy = RenditionPolicy(preferred_height=None)
+
+    assert describe(policy.select(SOURCES)) == (1080, "mp4")
+
+
+def test_preferred_container_wins():
+    policy = RenditionPolicy(container="webm")
+
+    assert describe(policy.select(SOURCES)) == (720, "webm")
+
+
+def test_size_and_bitrate_limits():
+    by_size = RenditionPolicy(max_height=None, max_size=100 * 1024 ** 2)
+    by_bitrate = RenditionPolicy(max_height=None, max_bitrate=2000)
+
+    assert describe(by_size.select(SOURCES)) == (360, "mp4")
+    assert describe(by_bitrate.select(SOURCES)) == (720, "mp4")
+
+
+def test_nothing_fits_returns_none():
+    assert RenditionPolicy(max_height=240).select(SOURCES) is None
+    assert RenditionPolicy().select([]) is None
+
+
+def test_originals_need_opt_in():
+    flavors = [
+        {"id": "a", "height": 1080, "flavorParamsId": 0, "status": 2},
+        {"id": "b", "height": 480, "flavorParamsId": 5, "status": 2,
+         "isOriginal": False},
+        {"id": "c", "height": 720, "isOriginal": True, "status": 2},
+    ]
+
+    policy = RenditionPolicy(max_height=None)
+    assert policy.select_flavor(flavors).source["id"] == "b"
+    policy = RenditionPolicy(original=True, preferred_height=None)
+    assert policy.select_flavor(flavors).source["id"] == "a"
+
+
+def test_select_flavor_skips_unfinished():
+    flavors = [
+        {"id": "a", "height": 720, "status": 1},
+        {"id": "b", "height": 360, "status": 2},
+    ]
+
+    assert RenditionPolicy().select_flavor(flavors).source["id"] == "b"
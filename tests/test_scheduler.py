@@ -0,0 +1,98 @@
+import pytest
+
+from canvas_file_scraper.scheduler import (
+    Download, DownloadScheduler, TokenBucket, parse_priority, parse_size)
+
+
+def download(kind, size=None, course_id=1):
+    return Download(
+        kind, "url", f"{kind}-{size}-{course_id}", None,
+        size=size, course_id=course_id)
+
+
+def drained(downloads):
+    if isinstance(downloads, DownloadScheduler):
+        downloads = downloads.drain()
+    return [d.path for d in downloads]
+
+
+def test_drain_orders_by_priority_then_size():
+    scheduler = DownloadScheduler()
+    for d in [
+            download("video"),
+            download("media", 1),
+            download("file", 30),
+            download("file"),
+            download("file", 10),
+            download("link", 2)]:
+        scheduler.add(d)
+
+    assert drained(scheduler) == [
+        "file-10-1", "file-30-1", "file-None-1",
+        "link-2-1", "media-1-1", "video-None-1"]
+    assert len(scheduler) == 0
+
+
+def test_drain_round_robins_between_courses():
+    scheduler = DownloadScheduler()
+    for d in [
+            download("file", 1, course_id=1),
+            download("file", 2, course_id=1),
+            download("file", 3, course_id=1),
+            download("file", 5, course_id=2),
+            download("video", 1, course_id=2)]:
+        scheduler.add(d)
+
+    assert drained(scheduler) == [
+        "file-1-1", "file-5-2", "file-2-1", "file-3-1", "video-1-2"]
+
+
+def test_drain_puts_unknown_kinds_last():
+    scheduler = DownloadScheduler(priority=["video"])
+    scheduler.add(download("file", 1))
+    scheduler.add(download("video", 100))
+
+    assert drained(scheduler) == ["video-100-1", "file-1-1"]
+
+
+def test_drain_can_hold_kinds_back():
+    scheduler = DownloadScheduler()
+    scheduler.add(download("video", 1))
+    scheduler.add(download("file", 2))
+
+    assert drained(scheduler.drain(skip=("video",))) == ["file-2-1"]
+    assert drained(scheduler) == ["video-1-1"]
+
+
+def test_parse_priority():
+    assert parse_priority("video,file") == ["video", "file"]
+    with pytest.raises(ValueError):
+        parse_priority("fiel,video")
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("100", 100),
+    ("500K", 500 * 1024),
+    ("2M", 2 * 1024 ** 2),
+    ("1.5g", int(1.5 * 1024 ** 3)),
+    ("10MB", 10 * 1024 ** 2),
+])
+def test_parse_size(value, expected):
+    assert parse_size(value) == expected
+
+
+def test_parse_size_rejects_garbage():
+    with pytest.raises(ValueError):
+        parse_size("fast")
+
+
+def test_token_bucket_sleeps_off_debt(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(
+        "canvas_file_scraper.scheduler.time.sleep", sleeps.append)
+    bucket = TokenBucket(100)
+
+    bucket.consume(100)
+    assert not sleeps
+    bucket.consume(50)
+    assert sleeps and sleeps[0] == pytest.approx(0.5, abs=0.05)
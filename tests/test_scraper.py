@@ -0,0 +1,137 @@
+import types
+import logging
+
+import pytest
+
+from canvas_file_scraper import scraper as scraper_module
+from canvas_file_scraper.journal import FailureJournal
+from canvas_file_scraper.scraper import CanvasScraper
+
+
+def ns(**kwargs):
+    return types.SimpleNamespace(**kwargs)
+
+
+class FakeCourse:
+    # The scraper patches get_media_objects onto the course class
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+
+@pytest.fixture
+def scraper(tmp_path, monkeypatch):
+    scraper = CanvasScraper(
+        "canvas.example.com", "key", str(tmp_path), "no", True, False,
+        logging.getLogger("test"))
+    scraper._user = ns(_requester=None)
+    downloaded = []
+
+    def stream(url, path, size=None, auth=True):
+        downloaded.append(path)
+        with open(path, "w") as f:
+            f.write(url)
+
+    monkeypatch.setattr(scraper, "_stream", stream)
+    scraper.downloaded = downloaded
+    return scraper
+
+
+def journal_from_last_run(scraper, *args, **kwargs):
+    FailureJournal(scraper.journal.path).record(*args, **kwargs)
+    scraper.journal = FailureJournal(scraper.journal.path)
+
+
+def video(media_id, url):
+    return ns(
+        media_id=media_id, title=f"{media_id}.mp4", media_type="video",
+        media_sources=[{"url": url, "height": "360", "size": "10"}])
+
+
+def test_retry_keeps_records_it_cannot_retry(scraper):
+    journal_from_last_run(
+        scraper, "item", 1, path=scraper._path, error="boom")
+
+    scraper.retry_failed()
+
+    assert len(scraper.journal) == 1
+    assert scraper.journal.records()[0]["attempts"] == 1
+
+
+def test_retry_media_object(scraper, monkeypatch):
+    course = FakeCourse(id=7, media=[video("m1", "other"), video("m2", "url")])
+    monkeypatch.setattr(
+        scraper._canvas, "get_course", lambda id: course)
+    monkeypatch.setattr(
+        scraper_module, "get_media_objects", lambda self: self.media)
+    journal_from_last_run(
+        scraper, "media_object", "m2", path=scraper._path, error="boom", course_id=7)
+
+    scraper.retry_failed()
+
+    assert len(scraper.journal) == 0
+    assert [p.rsplit("/", 1)[-1] for p in scraper.downloaded] == ["m2.mp4"]
+
+
+def course(id, files, videos):
+    folder = ns(
+        id=id * 10, full_name="course files",
+        get_files=lambda: [
+            ns(id=f"{id}-{name}", title=name, url=name, size=size)
+            for name, size in files])
+    return FakeCourse(
+        id=id, name=f"course {id}",
+        get_external_tools=lambda: [],
+        get_assignments=lambda: [],
+        get_pages=lambda: [],
+        show_front_page=lambda: ns(body="front page"),
+        get_modules=lambda: [],
+        get_groups=lambda: [],
+        get_folders=lambda: [folder],
+        media=[video(f"{id}-{name}", name) for name in videos])
+
+
+def test_scrape_shares_media_between_courses(scraper, monkeypatch):
+    courses = [
+        course(1, [("a.pdf", 20), ("b.pdf", 10)], ["v1", "v2"]),
+        course(2, [("c.pdf", 5)], ["v3"]),
+    ]
+    walked = []
+    recurse_course = scraper.recurse_course
+
+    def walk(c):
+        # Documents of earlier courses must already be down by now
+        walked.append((c.id, len(scraper.downloaded)))
+        recurse_course(c)
+
+    scraper._user = ns(_requester=None, get_courses=lambda: courses)
+    monkeypatch.setattr(scraper, "recurse_course", walk)
+    monkeypatch.setattr(
+        scraper_module, "get_media_objects", lambda self: self.media)
+
+    scraper.scrape()
+
+    assert walked == [(1, 0), (2, 2)]
+    assert [p.rsplit("/", 1)[-1] for p in scraper.downloaded] == [
+        "b.pdf", "a.pdf", "c.pdf", "1-v1.mp4", "2-v3.mp4", "1-v2.mp4"]
+    assert len(scraper.journal) == 0
+
+
+def test_failed_course_is_not_marked_synced(scraper, monkeypatch):
+    good = course(1, [("a.pdf", 1)], [])
+    broken = course(2, [("b.pdf", 1)], [])
+
+    def get_folders():
+        raise RuntimeError("canvas is down")
+
+    broken.get_folders = get_folders
+    scraper._user = ns(_requester=None, get_courses=lambda: [good, broken])
+    monkeypatch.setattr(
+        scraper_module, "get_media_objects", lambda self: self.media)
+
+    scraper.scrape()
+
+    courses = {c["id"]: c for c in scraper.state.courses()}
+    assert courses[1]["last_synced"] and courses[1]["failures"] == 0
+    assert courses[2]["last_synced"] is None
+    assert courses[2]["failures"] == 1
+    assert scraper.journal.records()[0]["kind"] == "course"
@@ -0,0 +1,75 @@
+import pytest
+
+from canvas_file_scraper.state import STATE_NAME, SyncState, list_files
+
+
+@pytest.fixture
+def state(tmp_path):
+    return SyncState(str(tmp_path / STATE_NAME))
+
+
+def write(path, data):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(data)
+
+
+def test_list_files_skips_hidden_and_partial(tmp_path):
+    write(tmp_path / "a" / "notes.pdf", b"12345")
+    write(tmp_path / "a" / "video.mp4.part", b"1")
+    write(tmp_path / ".hidden" / "x", b"1")
+    write(tmp_path / ".failures.json", b"{}")
+
+    files = [(path, size) for path, size, _ in list_files(str(tmp_path))]
+
+    assert files == [("a/notes.pdf", 5)]
+
+
+def test_round_trip(tmp_path, state):
+    assert not state
+    write(tmp_path / "Course A" / "x.pdf", b"123")
+    state.add_course(12, "Course A", "Course A")
+    state.add_course(13, "Course B", "Course B")
+    state.update_course(12, 0, True)
+    state.update_course(13, 2, False)
+    state.finish_run("scrape", 2)
+
+    reloaded = SyncState(state.path)
+    assert reloaded
+    assert reloaded.last_run["mode"] == "scrape"
+    assert reloaded.last_run["failures"] == 2
+    a, b = sorted(reloaded.courses(), key=lambda c: c["id"])
+    assert a["last_synced"] and a["files"] == 1 and a["bytes"] == 3
+    assert b["last_synced"] is None and b["failures"] == 2
+
+
+def test_failed_sync_keeps_last_good_one(tmp_path, state):
+    state.add_course(12, "Course A", "Course A")
+    state.update_course(12, 0, True)
+    synced = state.courses()[0]["last_synced"]
+
+    state.update_course(12, 1, False)
+
+    assert state.courses()[0]["last_synced"] == synced
+    assert state.courses()[0]["failures"] == 1
+
+
+def test_update_ignores_unknown_courses(state):
+    state.update_course(99, 1, True)
+
+    assert state.courses() == []
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("12", 12),
+    ("Physics 101", 12),
+    ("chem", 13),
+    ("101", None),
+    ("history", None),
+])
+def test_find_course(state, query, expected):
+    state.add_course(12, "Physics 101", "Physics 101")
+    state.add_course(13, "Chemistry 101", "Chemistry 101")
+
+    course = state.find_course(query)
+
+    assert (course["id"] if course else None) == expected
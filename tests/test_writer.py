@@ -0,0 +1,85 @@
+import os
+
+import pytest
+
+from canvas_file_scraper.writer import DiskWriter
+
+
+@pytest.fixture
+def writer():
+    writer = DiskWriter(max_buffer=128 * 1024)
+    yield writer
+    writer.close()
+
+
+def test_close_commits_file(tmp_path, writer):
+    path = str(tmp_path / "a.pdf")
+
+    with writer.open(path, course_id=1) as f:
+        f.write(b"hello ")
+        f.write(b"world")
+    writer.sync(1)
+    writer.close()
+
+    assert f.done.is_set() and not f.error
+    assert open(path, "rb").read() == b"hello world"
+    assert os.listdir(tmp_path) == ["a.pdf"]
+
+
+def test_abort_removes_partial_file(tmp_path, writer):
+    path = str(tmp_path / "a.pdf")
+
+    with pytest.raises(RuntimeError):
+        with writer.open(path) as f:
+            f.write(b"hello")
+            raise RuntimeError
+    writer.close()
+
+    assert f.done.is_set()
+    assert os.listdir(tmp_path) == []
+
+
+def test_preallocated_file_is_truncated(tmp_path):
+    writer = DiskWriter(preallocate=True)
+    path = str(tmp_path / "video.mp4")
+
+    with writer.open(path, size=1024 * 1024) as f:
+        f.write(b"x" * 1000)
+    writer.close()
+
+    assert os.path.getsize(path) == 1000
+
+
+def test_failed_open_is_reported(tmp_path, writer):
+    path = str(tmp_path / "missing" / "a.pdf")
+
+    with writer.open(path) as f:
+        f.write(b"hello")
+    writer.close()
+
+    assert f.done.is_set()
+    assert isinstance(f.error, FileNotFoundError)
+
+
+def test_writes_keep_flowing_past_buffer_size(tmp_path, writer):
+    path = str(tmp_path / "big.bin")
+    chunk = b"x" * 64 * 1024
+
+    with writer.open(path) as f:
+        for _ in range(20):
+            f.write(chunk)
+    writer.close()
+
+    assert os.path.getsize(path) == 20 * len(chunk)
+
+
+def test_dead_writer_does_not_hang(tmp_path, writer, monkeypatch):
+    monkeypatch.setattr(
+        writer, "_run", lambda: None)
+    path = str(tmp_path / "a.pdf")
+
+    with pytest.raises(RuntimeError):
+        f = writer.open(path)
+        for _ in range(10):
+            f.write(b"x")
+    writer.close()